@@ -0,0 +1,14 @@
+import pydantic
+
+
+class ColumnWidths(pydantic.BaseModel):
+    indent: str = "  "
+    prefix: int = 0
+    number: int = 0
+
+    def merge(self, other: "ColumnWidths") -> "ColumnWidths":
+        return ColumnWidths(
+            indent=self.indent,
+            prefix=max(self.prefix, other.prefix),
+            number=max(self.number, other.number),
+        )
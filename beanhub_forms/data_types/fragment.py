@@ -0,0 +1,9 @@
+import typing
+
+import pydantic
+
+
+class FormFragment(pydantic.BaseModel):
+    html: str
+    field_spec: dict[str, typing.Any]
+    etag: str
@@ -0,0 +1,24 @@
+import enum
+
+import pydantic
+
+
+@enum.unique
+class ApplyMode(str, enum.Enum):
+    # Open the file in append mode and write the content
+    append = "append"
+    # Read the whole file, then write it back with the content appended
+    rewrite = "rewrite"
+
+
+class LoadTestReport(pydantic.BaseModel):
+    clients: int
+    submissions: int
+    errors: int
+    duration: float
+    throughput: float
+    p50: float
+    p95: float
+    p99: float
+    lost_writes: int
+    interleaved_writes: int
@@ -30,6 +30,14 @@ def validate_currencies(form: Form, field: Field):
             field.errors.append(f"Currency {value} is invalid.")
 
 
+class DictFormData(dict):
+    # Minimal multi-dict interface WTForms expects from the form data
+    def getlist(self, key: str) -> list[str]:
+        if key not in self:
+            return []
+        return [self[key]]
+
+
 class DecimalAsStrField(DecimalField):
     def process_formdata(self, valuelist: list):
         super().process_formdata(valuelist)
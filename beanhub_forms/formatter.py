@@ -0,0 +1,175 @@
+import os
+import pathlib
+import re
+import threading
+import typing
+
+from .data_types.formatter import ColumnWidths
+from .data_types.processor import FileUpdate
+
+DEFAULT_INDENT = "  "
+ACCOUNT_PATTERN = "[A-Z][0-9a-zA-Z-]*(?::[A-Z0-9][0-9a-zA-Z-]*)+"
+AMOUNT_LINE_REGEX = re.compile(
+    rf"^(?P<prefix>[^\";]*?{ACCOUNT_PATTERN})\s+"
+    r"(?P<number>[-+]?\s*[\d,]*\.?\d+)\s+(?P<rest>\S.*)$"
+)
+
+
+def _indent_width(line: str) -> int:
+    return len(line) - len(line.lstrip(" \t").expandtabs())
+
+
+def _normalize_amount_line(line: str) -> typing.Optional[tuple[str, str, str]]:
+    match = AMOUNT_LINE_REGEX.match(line)
+    if match is None:
+        return None
+    return (
+        match.group("prefix"),
+        re.sub(r"\s+", "", match.group("number")),
+        match.group("rest"),
+    )
+
+
+def scan_column_widths(content: str) -> ColumnWidths:
+    """Scan beancount content and return the column widths used for aligning
+    amounts plus the indentation unit of postings
+
+    """
+    prefix_width = 0
+    number_width = 0
+    indent: typing.Optional[str] = None
+    for line in content.splitlines():
+        line = line.rstrip().expandtabs()
+        if not line:
+            continue
+        width = _indent_width(line)
+        if width and (indent is None or width < len(indent)):
+            indent = " " * width
+        parts = _normalize_amount_line(line)
+        if parts is None:
+            continue
+        prefix, number, _ = parts
+        prefix_width = max(prefix_width, len(prefix))
+        number_width = max(number_width, len(number))
+    return ColumnWidths(
+        indent=indent or DEFAULT_INDENT, prefix=prefix_width, number=number_width
+    )
+
+
+def _normalize_indentation(content: str, indent: str) -> list[str]:
+    lines = [line.rstrip().expandtabs() for line in content.splitlines()]
+    levels = sorted({_indent_width(line) for line in lines if line} - {0})
+    level_map = {width: i + 1 for i, width in enumerate(levels)}
+    result = []
+    for line in lines:
+        width = _indent_width(line)
+        if not line or not width:
+            result.append(line)
+            continue
+        result.append(indent * level_map[width] + line.lstrip())
+    return result
+
+
+def format_content(content: str, widths: ColumnWidths) -> str:
+    """Format the given beancount content by normalizing indentation of
+    postings and aligning amounts to the given column widths, or the widths of
+    the content itself if they are wider
+
+    """
+    lines = _normalize_indentation(content, indent=widths.indent)
+    widths = widths.merge(scan_column_widths("\n".join(lines)))
+    result = []
+    for line in lines:
+        parts = _normalize_amount_line(line)
+        if parts is None:
+            result.append(line)
+            continue
+        prefix, number, rest = parts
+        result.append(
+            f"{prefix.ljust(widths.prefix)}  {number.rjust(widths.number)} {rest}"
+        )
+    text = "\n".join(result)
+    if content.endswith("\n"):
+        text += "\n"
+    return text
+
+
+class ColumnWidthCache:
+    """Cache of column widths scanned from beancount files, keyed by file path
+    and invalidated when the file's mtime or size changes
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[pathlib.Path, tuple[tuple[int, int], ColumnWidths]] = {}
+
+    @staticmethod
+    def _stamp(stat: os.stat_result) -> tuple[int, int]:
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, file_path: pathlib.Path) -> ColumnWidths:
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            return ColumnWidths()
+        stamp = self._stamp(stat)
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+        widths = scan_column_widths(file_path.read_text(encoding="utf-8"))
+        with self._lock:
+            self._entries[file_path] = (stamp, widths)
+        return widths
+
+    def record_append(self, file_path: pathlib.Path, content: str):
+        """Fold content just appended to the file into the cached widths, so that
+        the next lookup doesn't need to scan the whole file again. If the file
+        changed by anything other than the appended content since it was
+        cached, the entry is dropped instead. The content is expected to be
+        written as UTF-8 without newline translation, i.e., with
+        `encoding="utf-8", newline=""`. This must be called while holding the
+        same lock as the one used for appending the content to the file,
+        otherwise another write may get in between
+
+        """
+        stamp = self._stamp(file_path.stat())
+        appended = scan_column_widths(content)
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is None:
+                return
+            (_, cached_size), widths = entry
+            _, size = stamp
+            if size != cached_size + len(content.encode("utf-8")):
+                del self._entries[file_path]
+                return
+            self._entries[file_path] = (stamp, widths.merge(appended))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def format_file_updates(
+    file_updates: list[FileUpdate],
+    cache: ColumnWidthCache,
+) -> list[FileUpdate]:
+    """Auto-format only the content of the given file updates, with column
+    widths taken from the existing target files. The cache is required, and it
+    should be kept around across submissions, otherwise the whole target files
+    will be scanned every time
+
+    """
+    file_widths: dict[pathlib.Path, ColumnWidths] = {}
+    formatted_updates: list[FileUpdate] = []
+    for file_update in file_updates:
+        file_path = pathlib.Path(file_update.file)
+        widths = file_widths.get(file_path)
+        if widths is None:
+            widths = cache.get(file_path)
+        content = format_content(file_update.content, widths=widths)
+        file_widths[file_path] = widths.merge(scan_column_widths(content))
+        formatted_updates.append(file_update.model_copy(update=dict(content=content)))
+    return formatted_updates
@@ -0,0 +1,308 @@
+import collections
+import datetime
+import decimal
+import hashlib
+import math
+import threading
+import typing
+
+import wtforms
+from markupsafe import Markup
+from wtforms.widgets import html_params
+
+from .data_types.form import AccountFormField
+from .data_types.form import CurrencyFormField
+from .data_types.form import DateFormField
+from .data_types.form import FileFormField
+from .data_types.form import FormField
+from .data_types.form import FormSchema
+from .data_types.form import NumberFormField
+from .data_types.form import StrFormField
+from .data_types.fragment import FormFragment
+from .form import ACCOUNT_REGEX
+from .form import CURRENCY_REGEX
+from .form import DictFormData
+from .form import make_custom_form
+
+JSON_SCHEMA_DIALECT = "https://json-schema.org/draft/2020-12/schema"
+# Bump this whenever the rendered HTML or field spec output changes, so that the
+# ETags of fragments rendered by the older code no longer match
+RENDER_VERSION = "2"
+
+
+def choices_version(choices: list[str]) -> str:
+    """Compute a version string for a choice list, for callers which don't keep
+    track of the versions of their accounts, currencies or files lists
+
+    """
+    digest = hashlib.sha256()
+    for choice in choices:
+        digest.update(choice.encode("utf8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _used_choice_lists(form_schema: FormSchema) -> set[str]:
+    used = set()
+    for field in form_schema.fields:
+        if isinstance(field, AccountFormField):
+            used.add("accounts")
+        elif isinstance(field, CurrencyFormField):
+            used.add("currencies")
+        elif isinstance(field, FileFormField):
+            used.add("files")
+    return used
+
+
+def _complete_choice_versions(
+    form_schema: FormSchema,
+    choice_versions: typing.Optional[dict[str, str]],
+    accounts: list[str],
+    currencies: list[str],
+    files: list[str],
+) -> dict[str, str]:
+    choice_versions = dict(choice_versions or {})
+    used = _used_choice_lists(form_schema)
+    for key, choices in (
+        ("accounts", accounts),
+        ("currencies", currencies),
+        ("files", files),
+    ):
+        if key in used and key not in choice_versions:
+            choice_versions[key] = choices_version(choices)
+    return choice_versions
+
+
+def compute_etag(form_schema: FormSchema, choice_versions: dict[str, str]) -> str:
+    """Compute a strong ETag of the rendered form from the schema and the
+    versions of the choice lists the schema's fields actually use
+
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{RENDER_VERSION}\0{wtforms.__version__}\0".encode("utf8"))
+    # Only the parts of the schema affecting the rendered fragment, so that
+    # changing operations or commit options won't invalidate the cache
+    digest.update(
+        form_schema.model_dump_json(include={"name", "display_name", "fields"}).encode(
+            "utf8"
+        )
+    )
+    for key in sorted(_used_choice_lists(form_schema)):
+        digest.update(b"\0")
+        digest.update(key.encode("utf8"))
+        digest.update(b"=")
+        digest.update(choice_versions[key].encode("utf8"))
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(etag: str, if_none_match: typing.Optional[str]) -> bool:
+    """Check the value of an If-None-Match header against the given ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for value in if_none_match.split(","):
+        value = value.strip()
+        if value.startswith("W/"):
+            value = value[2:]
+        if value == etag:
+            return True
+    return False
+
+
+def _make_field_property(
+    field: FormField,
+    accounts: list[str],
+    currencies: list[str],
+    files: list[str],
+) -> dict[str, typing.Any]:
+    default: typing.Any = field.default
+    if isinstance(field, StrFormField):
+        prop = dict(type="string")
+    elif isinstance(field, NumberFormField):
+        prop = dict(type="number")
+        if default is not None:
+            try:
+                number = float(decimal.Decimal(default))
+            except decimal.InvalidOperation:
+                number = math.nan
+            # Default value not being a valid number won't pass the validation
+            # anyway, and out of range values are not JSON compliant, so just
+            # leave it out from the schema
+            default = number if math.isfinite(number) else None
+    elif isinstance(field, DateFormField):
+        prop = dict(type="string", format="date")
+        if default is not None:
+            # Same as number, leave out invalid default values
+            try:
+                datetime.date.fromisoformat(default)
+            except ValueError:
+                default = None
+    elif isinstance(field, FileFormField):
+        prop = dict(type="string")
+        if field.creatable:
+            prop["examples"] = files
+        else:
+            prop["enum"] = files
+    elif isinstance(field, AccountFormField):
+        prop = dict(type="string", pattern=ACCOUNT_REGEX)
+        if field.creatable:
+            prop["examples"] = accounts
+        else:
+            prop["enum"] = accounts
+    elif isinstance(field, CurrencyFormField):
+        prop = dict(type="string", pattern=CURRENCY_REGEX)
+        if field.creatable:
+            prop["examples"] = currencies
+        else:
+            prop["enum"] = currencies
+        if field.multiple:
+            prop = dict(type="array", items=prop)
+            if field.required:
+                prop["minItems"] = 1
+            if default is not None:
+                default = [default]
+    else:
+        raise ValueError(f"Unsupported form type {field.type}")
+    prop["title"] = field.display_name or field.name
+    if default is not None:
+        prop["default"] = default
+    prop["x-beanhub-field-type"] = field.type.value
+    return prop
+
+
+def make_field_spec(
+    form_schema: FormSchema,
+    accounts: list[str],
+    currencies: list[str],
+    files: list[str],
+) -> dict[str, typing.Any]:
+    """Export the fields of a form schema as a JSON Schema document"""
+    return {
+        "$schema": JSON_SCHEMA_DIALECT,
+        "title": form_schema.display_name or form_schema.name,
+        "type": "object",
+        "properties": {
+            field.name: _make_field_property(
+                field, accounts=accounts, currencies=currencies, files=files
+            )
+            for field in form_schema.fields
+        },
+        "required": [field.name for field in form_schema.fields if field.required],
+    }
+
+
+def render_form_fragment(
+    form_schema: FormSchema,
+    accounts: list[str],
+    currencies: list[str],
+    files: list[str],
+) -> str:
+    """Render the fields of a form schema with their default values as a static
+    HTML fragment
+
+    """
+    CustomForm = make_custom_form(
+        form_schema=form_schema,
+        accounts=accounts,
+        currencies=currencies,
+        files=files,
+    )
+    form = CustomForm(
+        DictFormData(
+            (field.name, field.default)
+            for field in form_schema.fields
+            if field.default is not None
+        )
+    )
+    parts = [
+        Markup('<div class="field">{label}{widget}</div>').format(
+            label=form_field.label(), widget=form_field()
+        )
+        for form_field in form
+    ]
+    return str(
+        Markup("<div {params}>{fields}</div>").format(
+            params=Markup(html_params(class_="form", data_form_name=form_schema.name)),
+            fields=Markup("").join(parts),
+        )
+    )
+
+
+def make_form_fragment(
+    form_schema: FormSchema,
+    accounts: list[str],
+    currencies: list[str],
+    files: list[str],
+    choice_versions: typing.Optional[dict[str, str]] = None,
+) -> FormFragment:
+    """Render a form schema to a HTML fragment and JSON Schema document along
+    with the ETag of them
+
+    """
+    choice_versions = _complete_choice_versions(
+        form_schema,
+        choice_versions,
+        accounts=accounts,
+        currencies=currencies,
+        files=files,
+    )
+    return FormFragment(
+        html=render_form_fragment(
+            form_schema, accounts=accounts, currencies=currencies, files=files
+        ),
+        field_spec=make_field_spec(
+            form_schema, accounts=accounts, currencies=currencies, files=files
+        ),
+        etag=compute_etag(form_schema, choice_versions=choice_versions),
+    )
+
+
+class FormFragmentCache:
+    """LRU cache of rendered form fragments keyed by their ETag"""
+
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._fragments: collections.OrderedDict[
+            str, FormFragment
+        ] = collections.OrderedDict()
+
+    def get(
+        self,
+        form_schema: FormSchema,
+        accounts: list[str],
+        currencies: list[str],
+        files: list[str],
+        choice_versions: typing.Optional[dict[str, str]] = None,
+    ) -> FormFragment:
+        choice_versions = _complete_choice_versions(
+            form_schema,
+            choice_versions,
+            accounts=accounts,
+            currencies=currencies,
+            files=files,
+        )
+        etag = compute_etag(form_schema, choice_versions=choice_versions)
+        with self._lock:
+            fragment = self._fragments.get(etag)
+            if fragment is not None:
+                self._fragments.move_to_end(etag)
+                return fragment
+        fragment = make_form_fragment(
+            form_schema,
+            accounts=accounts,
+            currencies=currencies,
+            files=files,
+            choice_versions=choice_versions,
+        )
+        with self._lock:
+            self._fragments[etag] = fragment
+            self._fragments.move_to_end(etag)
+            while len(self._fragments) > self.max_size:
+                self._fragments.popitem(last=False)
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
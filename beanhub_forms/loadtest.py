@@ -0,0 +1,342 @@
+import argparse
+import concurrent.futures
+import dataclasses
+import datetime
+import logging
+import math
+import pathlib
+import tempfile
+import threading
+import time
+import typing
+
+import yaml
+
+from .data_types.form import FormDoc
+from .data_types.form import FormSchema
+from .data_types.loadtest import ApplyMode
+from .data_types.loadtest import LoadTestReport
+from .data_types.processor import FileUpdate
+from .form import DictFormData
+from .form import make_custom_form
+from .formatter import ColumnWidthCache
+from .formatter import format_file_updates
+from .processor import process_form
+
+FORM_DOC_PATH = pathlib.Path(".beanhub") / "forms.yaml"
+FORM_DOC = """\
+forms:
+- name: add-expense
+  fields:
+  - name: date
+    type: date
+    required: true
+  - name: file
+    type: file
+    creatable: true
+    required: true
+  - name: narration
+    type: str
+    required: true
+  - name: amount
+    type: number
+    required: true
+  - name: account
+    type: account
+    required: true
+  operations:
+  - type: append
+    file: "{{ file }}"
+    content: |
+      {{ date }} * {{ narration | tojson }}
+        {{ account }}      {{ amount }} USD
+        Assets:Cash
+"""
+ACCOUNTS = ["Expenses:Food", "Expenses:Rent", "Expenses:Travel:Airfare"]
+
+
+@dataclasses.dataclass
+class _Submission:
+    marker: str
+    file_updates: list[FileUpdate]
+    latency: float
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Compute the p-th percentile of the values with the nearest-rank method"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = max(math.ceil(p / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+def apply_file_update(
+    file_update: FileUpdate,
+    mode: ApplyMode,
+    width_cache: typing.Optional[ColumnWidthCache] = None,
+):
+    file_path = pathlib.Path(file_update.file)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    if mode == ApplyMode.append:
+        with file_path.open("at", encoding="utf-8", newline="") as fo:
+            fo.write(file_update.content)
+    elif mode == ApplyMode.rewrite:
+        content = ""
+        if file_path.exists():
+            with file_path.open("rt", encoding="utf-8", newline="") as fo:
+                content = fo.read()
+        with file_path.open("wt", encoding="utf-8", newline="") as fo:
+            fo.write(content + file_update.content)
+    else:
+        raise ValueError(f"Unsupported apply mode {mode.value}")
+    if width_cache is not None:
+        width_cache.record_append(file_path, file_update.content)
+
+
+class _Client:
+    def __init__(
+        self,
+        beancount_dir: pathlib.Path,
+        mode: ApplyMode,
+        file_count: int,
+        width_cache: typing.Optional[ColumnWidthCache],
+        file_locks: typing.Optional[dict[pathlib.Path, threading.Lock]],
+    ):
+        self.beancount_dir = beancount_dir
+        self.mode = mode
+        self.file_count = file_count
+        self.width_cache = width_cache
+        self.file_locks = file_locks
+
+    def load_form_schema(self) -> FormSchema:
+        with (self.beancount_dir / FORM_DOC_PATH).open("rt") as fo:
+            payload = yaml.safe_load(fo)
+        return FormDoc.model_validate(payload).forms[0]
+
+    def submit(self, client_id: int, seq: int) -> _Submission:
+        # The narration is unique to each submission, so that we can find
+        # the entry in the files to tell whether it's lost or interleaved
+        marker = f"loadtest-{client_id}-{seq}"
+        start = time.perf_counter()
+        form_schema = self.load_form_schema()
+        CustomForm = make_custom_form(
+            form_schema=form_schema,
+            accounts=ACCOUNTS,
+            currencies=["USD"],
+            files=[],
+        )
+        form = CustomForm(
+            DictFormData(
+                date=datetime.date.today().isoformat(),
+                file=f"books/{(client_id + seq) % self.file_count}.bean",
+                narration=marker,
+                amount=f"{seq + 1}.{client_id:02d}",
+                account=ACCOUNTS[seq % len(ACCOUNTS)],
+            )
+        )
+        if not form.validate():
+            raise ValueError(f"Invalid form data with errors {form.errors}")
+        file_updates = process_form(
+            form_schema, form_data=form.data, beancount_dir=self.beancount_dir
+        )
+        if form_schema.auto_format:
+            # Without the shared cache, the target files are scanned every time
+            width_cache = self.width_cache
+            if width_cache is None:
+                width_cache = ColumnWidthCache()
+            file_updates = format_file_updates(file_updates, cache=width_cache)
+        for file_update in file_updates:
+            if self.file_locks is None:
+                # The appended content can only be folded into the cached widths
+                # while holding the write lock, so without locking the cache
+                # gets invalidated by every write
+                apply_file_update(file_update, mode=self.mode)
+                continue
+            with self.file_locks[pathlib.Path(file_update.file)]:
+                apply_file_update(
+                    file_update, mode=self.mode, width_cache=self.width_cache
+                )
+        return _Submission(
+            marker=f'"{marker}"',
+            file_updates=file_updates,
+            latency=time.perf_counter() - start,
+        )
+
+    def run(self, client_id: int, submissions: int) -> tuple[list[_Submission], int]:
+        logger = logging.getLogger(__name__)
+        results: list[_Submission] = []
+        errors = 0
+        for seq in range(submissions):
+            try:
+                results.append(self.submit(client_id, seq))
+            except Exception:
+                logger.exception("Client %s failed to submit %s", client_id, seq)
+                errors += 1
+        return results, errors
+
+
+def check_writes(submissions: list[_Submission]) -> tuple[int, int]:
+    """Check the written files for the entries of the given submissions, and
+    return the numbers of lost and interleaved writes
+
+    """
+    file_contents: dict[str, str] = {}
+    lost = 0
+    interleaved = 0
+    for submission in submissions:
+        for file_update in submission.file_updates:
+            content = file_contents.get(file_update.file)
+            if content is None:
+                file_path = pathlib.Path(file_update.file)
+                content = ""
+                if file_path.exists():
+                    with file_path.open("rt", encoding="utf-8", newline="") as fo:
+                        content = fo.read()
+                file_contents[file_update.file] = content
+            if file_update.content in content:
+                continue
+            if submission.marker in content:
+                interleaved += 1
+            else:
+                lost += 1
+    return lost, interleaved
+
+
+def run_load_test(
+    clients: int,
+    submissions: int,
+    file_count: int = 1,
+    mode: ApplyMode = ApplyMode.append,
+    lock_files: bool = False,
+    cache_widths: bool = True,
+    beancount_dir: typing.Optional[pathlib.Path] = None,
+) -> LoadTestReport:
+    """Drive concurrent simulated clients submitting a form against a local
+    Beancount directory, a temporary one will be used if not provided. To avoid
+    messing up real books, a provided directory must be empty
+
+    """
+    if clients < 1 or submissions < 1 or file_count < 1:
+        raise ValueError("Clients, submissions and file count must be positive")
+    if beancount_dir is None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            return run_load_test(
+                clients=clients,
+                submissions=submissions,
+                file_count=file_count,
+                mode=mode,
+                lock_files=lock_files,
+                cache_widths=cache_widths,
+                beancount_dir=pathlib.Path(temp_dir),
+            )
+    beancount_dir = beancount_dir.absolute()
+    form_doc_path = beancount_dir / FORM_DOC_PATH
+    if beancount_dir.exists() and any(beancount_dir.iterdir()):
+        raise ValueError(
+            f"Beancount dir {str(beancount_dir)!r} is not empty, "
+            "please use an empty directory for load testing"
+        )
+    form_doc_path.parent.mkdir(parents=True, exist_ok=True)
+    form_doc_path.write_text(FORM_DOC)
+    file_locks = None
+    if lock_files:
+        file_locks = {
+            beancount_dir / "books" / f"{i}.bean": threading.Lock()
+            for i in range(file_count)
+        }
+    client = _Client(
+        beancount_dir=beancount_dir,
+        mode=mode,
+        file_count=file_count,
+        width_cache=ColumnWidthCache() if cache_widths else None,
+        file_locks=file_locks,
+    )
+
+    results: list[_Submission] = []
+    errors = 0
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=clients) as executor:
+        futures = [
+            executor.submit(client.run, client_id, submissions)
+            for client_id in range(clients)
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            client_results, client_errors = future.result()
+            results.extend(client_results)
+            errors += client_errors
+    duration = time.perf_counter() - start
+
+    lost, interleaved = check_writes(results)
+    latencies = [result.latency for result in results]
+    return LoadTestReport(
+        clients=clients,
+        submissions=len(results),
+        errors=errors,
+        duration=duration,
+        throughput=len(results) / duration if duration else 0.0,
+        p50=percentile(latencies, 50),
+        p95=percentile(latencies, 95),
+        p99=percentile(latencies, 99),
+        lost_writes=lost,
+        interleaved_writes=interleaved,
+    )
+
+
+def _positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a positive integer")
+    return number
+
+
+def main(argv: typing.Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Load test form submissions against a local Beancount directory"
+    )
+    parser.add_argument("-c", "--clients", type=_positive_int, default=8)
+    parser.add_argument(
+        "-n",
+        "--submissions",
+        type=_positive_int,
+        default=50,
+        help="Submissions per client",
+    )
+    parser.add_argument(
+        "-f", "--files", type=_positive_int, default=1, dest="file_count"
+    )
+    parser.add_argument(
+        "-m",
+        "--mode",
+        type=ApplyMode,
+        choices=[mode.value for mode in ApplyMode],
+        default=ApplyMode.append,
+    )
+    parser.add_argument("--lock-files", action="store_true")
+    parser.add_argument("--no-width-cache", action="store_true")
+    parser.add_argument(
+        "--beancount-dir",
+        type=pathlib.Path,
+        help="Empty directory to run against instead of a temporary one",
+    )
+    args = parser.parse_args(argv)
+    try:
+        report = run_load_test(
+            clients=args.clients,
+            submissions=args.submissions,
+            file_count=args.file_count,
+            mode=args.mode,
+            lock_files=args.lock_files,
+            cache_widths=not args.no_width_cache,
+            beancount_dir=args.beancount_dir,
+        )
+    except ValueError as exc:
+        parser.error(str(exc))
+    print(report.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import pathlib
+import textwrap
+
+import pytest
+
+from beanhub_forms.data_types.form import OperationType
+from beanhub_forms.data_types.formatter import ColumnWidths
+from beanhub_forms.data_types.processor import FileUpdate
+from beanhub_forms.formatter import ColumnWidthCache
+from beanhub_forms.formatter import format_content
+from beanhub_forms.formatter import format_file_updates
+from beanhub_forms.formatter import scan_column_widths
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        pytest.param("", ColumnWidths(), id="empty"),
+        pytest.param(
+            textwrap.dedent(
+                """\
+            2023-10-05 * "Coffee"
+                Assets:Cash        -5.00 USD
+                Expenses:Food:Coffee
+            2023-10-06 * "Rent"
+                Assets:Bank  -1,200.00 USD
+                Expenses:Rent
+            """
+            ),
+            ColumnWidths(indent="    ", prefix=15, number=9),
+            id="postings",
+        ),
+        pytest.param(
+            "2023-10-05 balance Assets:Cash 100 USD\n",
+            ColumnWidths(prefix=30, number=3),
+            id="balance",
+        ),
+        pytest.param(
+            '; Assets:Cash 100 USD\n2023-10-05 * "Assets:Cash 100 USD"\n',
+            ColumnWidths(),
+            id="comment-and-narration",
+        ),
+    ],
+)
+def test_scan_column_widths(content: str, expected: ColumnWidths):
+    assert scan_column_widths(content) == expected
+
+
+@pytest.mark.parametrize(
+    "content, widths, expected",
+    [
+        pytest.param(
+            textwrap.dedent(
+                """\
+            2023-10-11 * "Hours"
+              Assets:AccountsReceivable:Contracting:XYZ      12 XYZ.HOUR @ 300 USD
+              Income:Contracting:XYZ      
+            """
+            ),
+            ColumnWidths(),
+            textwrap.dedent(
+                """\
+            2023-10-11 * "Hours"
+              Assets:AccountsReceivable:Contracting:XYZ  12 XYZ.HOUR @ 300 USD
+              Income:Contracting:XYZ
+            """
+            ),
+            id="own-widths",
+        ),
+        pytest.param(
+            textwrap.dedent(
+                """\
+            2023-10-11 * "Coffee"
+             Assets:Cash -5.00 USD
+             Expenses:Food
+               note: "latte"
+            """
+            ),
+            ColumnWidths(indent="    ", prefix=30, number=9),
+            textwrap.dedent(
+                """\
+            2023-10-11 * "Coffee"
+                Assets:Cash                     -5.00 USD
+                Expenses:Food
+                    note: "latte"
+            """
+            ),
+            id="existing-widths",
+        ),
+        pytest.param(
+            "2023-10-11 *\n\tAssets:Cash\t- 5 USD",
+            ColumnWidths(),
+            "2023-10-11 *\n  Assets:Cash  -5 USD",
+            id="tabs-no-trailing-newline",
+        ),
+    ],
+)
+def test_format_content(content: str, widths: ColumnWidths, expected: str):
+    assert format_content(content, widths=widths) == expected
+
+
+def test_column_width_cache(tmp_path: pathlib.Path):
+    bean_file = tmp_path / "main.bean"
+    bean_file.write_text("2023-10-05 *\n  Assets:Cash  -5.00 USD\n  Expenses:Food\n")
+    cache = ColumnWidthCache()
+    assert cache.get(bean_file) == ColumnWidths(prefix=13, number=5)
+    assert cache.get(tmp_path / "missing.bean") == ColumnWidths()
+
+    content = "2023-10-06 *\n  Assets:Bank  -1200.00 USD\n  Expenses:Food\n"
+    with bean_file.open("at", encoding="utf-8", newline="") as fo:
+        fo.write(content)
+    cache.record_append(bean_file, content)
+    assert cache.get(bean_file) == ColumnWidths(prefix=13, number=8)
+
+    # The file gets changed without us knowing, the cache should rescan it
+    bean_file.write_text("2023-10-05 *\n  Assets:Cash  -5 USD\n  Expenses:Food\n\n")
+    assert cache.get(bean_file) == ColumnWidths(prefix=13, number=2)
+
+
+def test_column_width_cache_outside_edit(tmp_path: pathlib.Path):
+    bean_file = tmp_path / "main.bean"
+    bean_file.write_text("2023-10-05 *\n  Assets:Cash  -5 USD\n  Expenses:Food\n")
+    cache = ColumnWidthCache()
+    assert cache.get(bean_file) == ColumnWidths(prefix=13, number=2)
+
+    # Another process edits the file without going through the cache
+    with bean_file.open("at", encoding="utf-8", newline="") as fo:
+        fo.write("2023-10-06 *\n  Assets:Very:Long:Account:Name  1000000.00 USD\n")
+    content = "2023-10-07 *\n  Assets:Cash  1 USD\n"
+    with bean_file.open("at", encoding="utf-8", newline="") as fo:
+        fo.write(content)
+    cache.record_append(bean_file, content)
+    assert cache.get(bean_file) == ColumnWidths(prefix=31, number=10)
+
+
+def test_column_width_cache_utf8(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+):
+    bean_file = tmp_path / "main.bean"
+    bean_file.write_bytes('2023-10-05 * "Café"\n  Assets:Cash  -5 USD\n'.encode())
+    cache = ColumnWidthCache()
+    assert cache.get(bean_file) == ColumnWidths(prefix=13, number=2)
+
+    content = '2023-10-06 * "Crème brûlée"\r\n  Assets:Cash  -10.00 USD\r\n'
+    with bean_file.open("at", encoding="utf-8", newline="") as fo:
+        fo.write(content)
+    cache.record_append(bean_file, content)
+
+    def read_text(*args, **kwargs):
+        raise AssertionError("The file should not be scanned again")
+
+    monkeypatch.setattr(pathlib.Path, "read_text", read_text)
+    assert cache.get(bean_file) == ColumnWidths(prefix=13, number=6)
+
+
+def test_format_file_updates(tmp_path: pathlib.Path):
+    bean_file = tmp_path / "main.bean"
+    bean_file.write_text("2023-10-05 *\n    Assets:Cash    -5.00 USD\n")
+    updates = format_file_updates(
+        [
+            FileUpdate(
+                file=str(bean_file),
+                new_file=False,
+                type=OperationType.append,
+                content="2023-10-06 *\n  Assets:Cash 1 USD\n",
+            ),
+            FileUpdate(
+                file=str(bean_file),
+                new_file=False,
+                type=OperationType.append,
+                content="2023-10-07 *\n  Assets:Bank -1000.00 USD\n",
+            ),
+            FileUpdate(
+                file=str(tmp_path / "new.bean"),
+                new_file=True,
+                type=OperationType.append,
+                content="2023-10-07 *\n\tAssets:Bank -1 USD\n",
+            ),
+        ],
+        cache=ColumnWidthCache(),
+    )
+    assert [update.content for update in updates] == [
+        "2023-10-06 *\n    Assets:Cash      1 USD\n",
+        "2023-10-07 *\n    Assets:Bank  -1000.00 USD\n",
+        "2023-10-07 *\n  Assets:Bank  -1 USD\n",
+    ]
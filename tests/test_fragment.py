@@ -0,0 +1,242 @@
+import json
+import typing
+
+import pytest
+
+from beanhub_forms import fragment
+from beanhub_forms.data_types.form import AccountFormField
+from beanhub_forms.data_types.form import CurrencyFormField
+from beanhub_forms.data_types.form import DateFormField
+from beanhub_forms.data_types.form import FileFormField
+from beanhub_forms.data_types.form import FormSchema
+from beanhub_forms.data_types.form import NumberFormField
+from beanhub_forms.data_types.form import Operation
+from beanhub_forms.data_types.form import StrFormField
+from beanhub_forms.form import ACCOUNT_REGEX
+from beanhub_forms.form import CURRENCY_REGEX
+from beanhub_forms.fragment import compute_etag
+from beanhub_forms.fragment import etag_matches
+from beanhub_forms.fragment import FormFragmentCache
+from beanhub_forms.fragment import make_field_spec
+from beanhub_forms.fragment import make_form_fragment
+from beanhub_forms.fragment import render_form_fragment
+
+
+@pytest.fixture
+def form_schema() -> FormSchema:
+    return FormSchema(
+        name="add-expense",
+        display_name="Add expense",
+        fields=[
+            DateFormField(name="date", required=True, default="2023-10-05"),
+            NumberFormField(name="amount", display_name="Amount", default="12.50"),
+            StrFormField(name="narration"),
+            AccountFormField(name="account", default="Expenses:Food"),
+            CurrencyFormField(name="currencies", multiple=True, creatable=True),
+        ],
+        operations=[],
+    )
+
+
+def test_make_field_spec(form_schema: FormSchema):
+    assert make_field_spec(
+        form_schema,
+        accounts=["Expenses:Food", "Expenses:Rent"],
+        currencies=["USD"],
+        files=[],
+    ) == {
+        "$schema": "https://json-schema.org/draft/2020-12/schema",
+        "title": "Add expense",
+        "type": "object",
+        "properties": {
+            "date": {
+                "type": "string",
+                "format": "date",
+                "title": "date",
+                "default": "2023-10-05",
+                "x-beanhub-field-type": "date",
+            },
+            "amount": {
+                "type": "number",
+                "title": "Amount",
+                "default": 12.5,
+                "x-beanhub-field-type": "number",
+            },
+            "narration": {
+                "type": "string",
+                "title": "narration",
+                "x-beanhub-field-type": "str",
+            },
+            "account": {
+                "type": "string",
+                "pattern": ACCOUNT_REGEX,
+                "enum": ["Expenses:Food", "Expenses:Rent"],
+                "title": "account",
+                "default": "Expenses:Food",
+                "x-beanhub-field-type": "account",
+            },
+            "currencies": {
+                "type": "array",
+                "items": {
+                    "type": "string",
+                    "pattern": CURRENCY_REGEX,
+                    "examples": ["USD"],
+                },
+                "title": "currencies",
+                "x-beanhub-field-type": "currency",
+            },
+        },
+        "required": ["date"],
+    }
+
+
+@pytest.mark.parametrize(
+    "default, expected",
+    [
+        ("2023-10-05", "2023-10-05"),
+        ("bad", None),
+        ("2023-13-01", None),
+    ],
+)
+def test_date_field_spec_default(default: str, expected: typing.Optional[str]):
+    form_schema = FormSchema(
+        name="my-form",
+        fields=[DateFormField(name="date", default=default)],
+        operations=[],
+    )
+    field_spec = make_field_spec(form_schema, accounts=[], currencies=[], files=[])
+    assert field_spec["properties"]["date"].get("default") == expected
+
+
+@pytest.mark.parametrize(
+    "required, expected",
+    [
+        (True, 1),
+        (False, None),
+    ],
+)
+def test_multiple_currency_field_spec_required(
+    required: bool, expected: typing.Optional[int]
+):
+    form_schema = FormSchema(
+        name="my-form",
+        fields=[CurrencyFormField(name="currencies", multiple=True, required=required)],
+        operations=[],
+    )
+    field_spec = make_field_spec(form_schema, accounts=[], currencies=[], files=[])
+    assert field_spec["properties"]["currencies"].get("minItems") == expected
+
+
+def test_render_form_fragment(form_schema: FormSchema):
+    html = render_form_fragment(
+        form_schema,
+        accounts=["Expenses:Food", "Expenses:Rent"],
+        currencies=["USD"],
+        files=[],
+    )
+    assert html.startswith('<div class="form" data-form-name="add-expense">')
+    assert 'name="date" required type="date" value="2023-10-05"' in html
+    assert 'name="amount" step="any" type="number" value="12.50"' in html
+    assert '<option selected value="Expenses:Food">Expenses:Food</option>' in html
+    assert '<option value="Expenses:Rent">Expenses:Rent</option>' in html
+    assert html.count('<div class="field">') == 5
+
+
+def test_compute_etag(form_schema: FormSchema):
+    choice_versions = dict(accounts="1", currencies="1")
+    etag = compute_etag(form_schema, choice_versions=choice_versions)
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == compute_etag(form_schema, choice_versions=choice_versions)
+    # Files are not used by any field, so its version doesn't matter
+    assert etag == compute_etag(
+        form_schema, choice_versions=dict(choice_versions, files="2")
+    )
+    assert etag != compute_etag(
+        form_schema, choice_versions=dict(choice_versions, accounts="2")
+    )
+    changed_schema = form_schema.model_copy(update=dict(display_name="Other"))
+    assert etag != compute_etag(changed_schema, choice_versions=choice_versions)
+    # Operations and other options don't affect the rendered fragment
+    changed_schema = form_schema.model_copy(
+        update=dict(
+            operations=[Operation(file="main.bean", content="; {{ date }}")],
+            auto_format=False,
+        )
+    )
+    assert etag == compute_etag(changed_schema, choice_versions=choice_versions)
+
+
+def test_compute_etag_render_version(
+    monkeypatch: pytest.MonkeyPatch, form_schema: FormSchema
+):
+    choice_versions = dict(accounts="1", currencies="1")
+    etag = compute_etag(form_schema, choice_versions=choice_versions)
+    monkeypatch.setattr(fragment, "RENDER_VERSION", "mock-version")
+    assert etag != compute_etag(form_schema, choice_versions=choice_versions)
+
+
+@pytest.mark.parametrize(
+    "default, expected",
+    [
+        ("300", 300.0),
+        ("12.50", 12.5),
+        ("1e2", 100.0),
+        ("bad", None),
+        ("NaN", None),
+        ("1e400", None),
+    ],
+)
+def test_number_field_spec_default(default: str, expected: typing.Optional[float]):
+    form_schema = FormSchema(
+        name="my-form",
+        fields=[NumberFormField(name="amount", default=default)],
+        operations=[],
+    )
+    field_spec = make_field_spec(form_schema, accounts=[], currencies=[], files=[])
+    assert field_spec["properties"]["amount"].get("default") == expected
+    json.dumps(field_spec, allow_nan=False)
+
+
+@pytest.mark.parametrize(
+    "if_none_match, expected",
+    [
+        (None, False),
+        ("", False),
+        ("*", True),
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"xyz", "abc"', True),
+        ('"xyz"', False),
+    ],
+)
+def test_etag_matches(if_none_match: typing.Optional[str], expected: bool):
+    assert etag_matches('"abc"', if_none_match) == expected
+
+
+def test_form_fragment_cache(form_schema: FormSchema):
+    cache = FormFragmentCache(max_size=1)
+    kwargs = dict(accounts=["Expenses:Food"], currencies=["USD"], files=[])
+    fragment = cache.get(form_schema, **kwargs)
+    assert fragment == make_form_fragment(form_schema, **kwargs)
+    assert cache.get(form_schema, **kwargs) is fragment
+    # Files are not used by any field, so changing them hits the cache
+    assert cache.get(form_schema, **dict(kwargs, files=["main.bean"])) is fragment
+
+    other_fragment = cache.get(
+        form_schema, **dict(kwargs, accounts=["Expenses:Food", "Expenses:Rent"])
+    )
+    assert other_fragment.etag != fragment.etag
+    assert "Expenses:Rent" in other_fragment.html
+    # Evicted by the other fragment
+    assert cache.get(form_schema, **kwargs) is not fragment
+
+
+def test_file_field_fragment():
+    form_schema = FormSchema(
+        name="my-form", fields=[FileFormField(name="file")], operations=[]
+    )
+    fragment = make_form_fragment(
+        form_schema, accounts=[], currencies=[], files=["main.bean"]
+    )
+    assert fragment.field_spec["properties"]["file"]["enum"] == ["main.bean"]
+    assert '<option value="main.bean">main.bean</option>' in fragment.html
@@ -0,0 +1,149 @@
+import json
+import pathlib
+
+import pytest
+
+from beanhub_forms.data_types.form import OperationType
+from beanhub_forms.data_types.loadtest import ApplyMode
+from beanhub_forms.data_types.processor import FileUpdate
+from beanhub_forms.loadtest import _Submission
+from beanhub_forms.loadtest import check_writes
+from beanhub_forms.loadtest import main
+from beanhub_forms.loadtest import percentile
+from beanhub_forms.loadtest import run_load_test
+
+
+@pytest.mark.parametrize(
+    "values, p, expected",
+    [
+        ([], 50, 0.0),
+        ([3.0], 99, 3.0),
+        ([4.0, 1.0, 3.0, 2.0], 50, 2.0),
+        ([float(i) for i in range(1, 101)], 95, 95.0),
+        ([float(i) for i in range(1, 101)], 99, 99.0),
+    ],
+)
+def test_percentile(values: list[float], p: float, expected: float):
+    assert percentile(values, p) == expected
+
+
+def test_check_writes(tmp_path: pathlib.Path):
+    bean_file = tmp_path / "main.bean"
+    bean_file.write_text('; "a"\n; "c" broken\n')
+
+    def make_submission(marker: str, content: str) -> _Submission:
+        return _Submission(
+            marker=marker,
+            file_updates=[
+                FileUpdate(
+                    file=str(bean_file),
+                    new_file=False,
+                    type=OperationType.append,
+                    content=content,
+                )
+            ],
+            latency=0,
+        )
+
+    assert check_writes(
+        [
+            make_submission('"a"', '; "a"\n'),
+            make_submission('"b"', '; "b"\n'),
+            make_submission('"c"', '; "c"\n'),
+        ]
+    ) == (1, 1)
+
+
+@pytest.mark.parametrize(
+    "mode, file_count",
+    [
+        (ApplyMode.append, 1),
+        (ApplyMode.rewrite, 2),
+    ],
+)
+def test_run_load_test(tmp_path: pathlib.Path, mode: ApplyMode, file_count: int):
+    report = run_load_test(
+        clients=4,
+        submissions=5,
+        file_count=file_count,
+        mode=mode,
+        lock_files=True,
+        beancount_dir=tmp_path,
+    )
+    assert report.clients == 4
+    assert report.submissions == 20
+    assert report.errors == 0
+    assert report.lost_writes == 0
+    assert report.interleaved_writes == 0
+    assert 0 < report.p50 <= report.p95 <= report.p99
+    assert report.throughput > 0
+    assert len(list((tmp_path / "books").glob("*.bean"))) == file_count
+
+
+@pytest.mark.parametrize(
+    "existing_file",
+    [
+        ".beanhub/forms.yaml",
+        "books/0.bean",
+        "main.bean",
+    ],
+)
+def test_run_load_test_existing_dir(tmp_path: pathlib.Path, existing_file: str):
+    file_path = tmp_path / existing_file
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_text("; my own books")
+    with pytest.raises(ValueError):
+        run_load_test(clients=1, submissions=1, beancount_dir=tmp_path)
+    assert [
+        path.relative_to(tmp_path) for path in tmp_path.glob("**/*") if path.is_file()
+    ] == [pathlib.Path(existing_file)]
+    assert file_path.read_text() == "; my own books"
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(clients=0, submissions=1),
+        dict(clients=1, submissions=0),
+        dict(clients=1, submissions=1, file_count=0),
+    ],
+)
+def test_run_load_test_invalid_args(tmp_path: pathlib.Path, kwargs: dict):
+    with pytest.raises(ValueError):
+        run_load_test(beancount_dir=tmp_path, **kwargs)
+    assert not any(tmp_path.iterdir())
+
+
+def test_main(capsys: pytest.CaptureFixture, tmp_path: pathlib.Path):
+    main(
+        [
+            "-c",
+            "2",
+            "-n",
+            "3",
+            "-m",
+            "rewrite",
+            "--lock-files",
+            "--beancount-dir",
+            str(tmp_path),
+        ]
+    )
+    report = json.loads(capsys.readouterr().out)
+    assert report["submissions"] == 6
+    assert report["lost_writes"] == 0
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["-c", "0"],
+        ["-n", "-1"],
+        ["-f", "0"],
+        ["-f", "one"],
+        ["-m", "ApplyMode.append"],
+    ],
+)
+def test_main_invalid_args(capsys: pytest.CaptureFixture, argv: list[str]):
+    with pytest.raises(SystemExit):
+        main(argv)
+    assert "error: argument" in capsys.readouterr().err